@@ -0,0 +1,331 @@
+import numpy as np
+import pandas as pd
+from collections import deque
+import json
+import logging
+
+
+class EWMAZScoreDetector:
+    """Flags samples that deviate from an exponentially weighted mean/variance"""
+
+    name = 'ewma_zscore'
+
+    def __init__(self, alpha=0.1, threshold=4.0, warmup=20, severity='medium'):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.severity = severity
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, value):
+        """Score one sample against the state before it, then absorb it"""
+        score = None
+        if self.count == 0:
+            self.mean = value
+        else:
+            deviation = value - self.mean
+            if self.count >= self.warmup and self.var > 0:
+                score = deviation / np.sqrt(self.var)
+            self.mean += self.alpha * deviation
+            self.var = (1 - self.alpha) * (self.var + self.alpha * deviation**2)
+        self.count += 1
+        return score if score is not None and abs(score) > self.threshold else None
+
+    def batch(self, values):
+        """Vectorized equivalent of update() over a whole series (NaNs skipped)"""
+        values = values.dropna().astype(float)
+        scores = pd.Series(np.nan, index=values.index)
+        if len(values) < 2:
+            return scores
+
+        mean = values.ewm(alpha=self.alpha, adjust=False).mean()
+        deviation = values - mean.shift(1)
+        weighted = (1 - self.alpha) * deviation**2
+        weighted.iloc[0] = 0.0
+        var = weighted.ewm(alpha=self.alpha, adjust=False).mean()
+
+        prior_var = var.shift(1)
+        valid = (np.arange(len(values)) >= self.warmup) & (prior_var > 0)
+        scores[valid] = deviation[valid] / np.sqrt(prior_var[valid])
+        return scores.where(scores.abs() > self.threshold)
+
+
+class CUSUMDetector:
+    """Two-sided CUSUM on standardized deviations from a baseline
+
+    Without a configured target/sigma the baseline is estimated from the first
+    warmup samples and re-estimated from the warmup samples after every alarm,
+    so a persistent shift is reported once and then becomes the new baseline.
+    Both sums restart from zero after an alarm.
+    """
+
+    name = 'cusum'
+
+    def __init__(self, drift=0.5, threshold=8.0, warmup=30, target=None, sigma=None,
+                 severity='medium'):
+        self.drift = drift
+        self.threshold = threshold
+        self.warmup = warmup
+        self.configured_target = target
+        self.configured_sigma = sigma
+        self.severity = severity
+        self.reset_baseline()
+
+    def reset_baseline(self):
+        self.target = self.configured_target
+        self.sigma = self.configured_sigma
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.upper = 0.0
+        self.lower = 0.0
+
+    def update(self, value):
+        """Accumulate drift; alert and restart when either sum exceeds the threshold"""
+        if self.target is None or self.sigma is None:
+            # Welford estimate of the baseline over the warmup window
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+            if self.count >= self.warmup:
+                self.target = self.mean if self.target is None else self.target
+                self.sigma = self.sigma or np.sqrt(self.m2 / self.count) or 1.0
+            return None
+
+        z = (value - self.target) / self.sigma
+        self.upper = max(0.0, self.upper + z - self.drift)
+        self.lower = max(0.0, self.lower - z - self.drift)
+        if self.upper <= self.threshold and self.lower <= self.threshold:
+            return None
+
+        score = self.upper if self.upper > self.threshold else -self.lower
+        self.reset_baseline()
+        return score
+
+    def batch(self, values):
+        """Vectorized equivalent of update() over a whole series (NaNs skipped)"""
+        values = values.dropna().astype(float)
+        scores = pd.Series(np.nan, index=values.index)
+        data = values.to_numpy()
+        position = 0
+
+        while position < len(data):
+            target, sigma = self.configured_target, self.configured_sigma
+            if target is None or sigma is None:
+                if len(data) - position < self.warmup:
+                    break
+                baseline = data[position:position + self.warmup]
+                target = baseline.mean() if target is None else target
+                sigma = sigma or baseline.std() or 1.0
+                position += self.warmup
+
+            # Lindley recursion S_t = max(0, S_{t-1} + x_t) as cumsum minus running minimum
+            z = (data[position:] - target) / sigma
+            sums = []
+            for sign in (1, -1):
+                steps = np.cumsum(sign * z - self.drift)
+                sums.append(steps - np.minimum(np.minimum.accumulate(steps), 0))
+            upper, lower = sums
+
+            alarms = np.flatnonzero((upper > self.threshold) | (lower > self.threshold))
+            if len(alarms) == 0:
+                break
+            alarm = alarms[0]
+            scores.iloc[position + alarm] = upper[alarm] if upper[alarm] > self.threshold else -lower[alarm]
+            # Both sums (and an estimated baseline) restart after the alarm
+            position += alarm + 1
+
+        return scores
+
+
+class RateOfChangeDetector:
+    """Flags step-to-step jumps, either above a fixed limit or unusual for the signal"""
+
+    name = 'rate_of_change'
+
+    def __init__(self, max_change=None, threshold=5.0, alpha=0.05, warmup=20,
+                 severity='medium'):
+        self.max_change = max_change
+        self.severity = severity
+        self.previous = None
+        # Without a fixed limit, score the first differences with an EWMA z-score
+        self.adaptive = EWMAZScoreDetector(alpha=alpha, threshold=threshold, warmup=warmup)
+
+    def update(self, value):
+        previous, self.previous = self.previous, value
+        if previous is None:
+            return None
+        change = value - previous
+        if self.max_change is not None:
+            return change if abs(change) > self.max_change else None
+        return self.adaptive.update(change)
+
+    def batch(self, values):
+        changes = values.dropna().astype(float).diff().iloc[1:]
+        if self.max_change is not None:
+            return changes.where(changes.abs() > self.max_change)
+        return self.adaptive.batch(changes)
+
+
+class ThresholdDetector:
+    """Fixed operating limits"""
+
+    name = 'threshold'
+
+    def __init__(self, lower=None, upper=None, severity='high'):
+        self.lower = lower
+        self.upper = upper
+        self.severity = severity
+
+    def update(self, value):
+        if (self.lower is not None and value < self.lower) or \
+                (self.upper is not None and value > self.upper):
+            return value
+        return None
+
+    def batch(self, values):
+        values = values.dropna().astype(float)
+        violated = pd.Series(False, index=values.index)
+        if self.lower is not None:
+            violated |= values < self.lower
+        if self.upper is not None:
+            violated |= values > self.upper
+        return values.where(violated)
+
+
+def default_detectors():
+    return [EWMAZScoreDetector(), CUSUMDetector(), RateOfChangeDetector()]
+
+
+# Per-signal detector factories; any other numeric signal gets default_detectors().
+# CUSUM assumes a stationary baseline, so strongly diurnal signals such as pv_power
+# either get a configured target/sigma or skip CUSUM altogether. Signals that step
+# with the hourly schedule would alert on every setpoint change under z-score or
+# CUSUM, so they are excluded.
+SIGNAL_DETECTORS = {
+    'o2_production': lambda: [],
+    'safety_setpoint': lambda: [],
+    'actual_production': lambda: [],
+    'pv_power': lambda: [EWMAZScoreDetector(), RateOfChangeDetector()],
+    'grid_power': lambda: [EWMAZScoreDetector(), RateOfChangeDetector()],
+    'efficiency': lambda: default_detectors() + [RateOfChangeDetector(max_change=5)],
+    'safety_margin': lambda: default_detectors() + [ThresholdDetector(lower=10)],
+    'stack_temperature': lambda: default_detectors() + [ThresholdDetector(upper=85)],
+    'system_pressure': lambda: default_detectors() + [ThresholdDetector(upper=60)]
+}
+
+
+class StreamingAnomalyDetector:
+    def __init__(self, signal_detectors=None, max_alerts=100):
+        self.signal_detectors = dict(SIGNAL_DETECTORS)
+        self.signal_detectors.update(signal_detectors or {})
+        self.detectors = {}
+        self.listeners = []
+        self.recent_alerts = deque(maxlen=max_alerts)
+        self.samples_seen = 0
+        self.signal_samples = {}  # signal -> samples seen; sources arrive at different rates
+        self.logger = logging.getLogger(__name__)
+
+    def add_listener(self, listener):
+        """Register a callable invoked with every new alert"""
+        self.listeners.append(listener)
+
+    def detectors_for(self, signal):
+        if signal not in self.detectors:
+            factory = self.signal_detectors.get(signal, default_detectors)
+            self.detectors[signal] = factory()
+        return self.detectors[signal]
+
+    def build_alert(self, signal, detector, value, score, timestamp):
+        return {
+            'type': f'{signal}_{detector.name}',
+            'signal': signal,
+            'detector': detector.name,
+            'severity': detector.severity,
+            'value': float(value),
+            'score': float(score),
+            'timestamp': timestamp,
+            'sample': self.signal_samples[signal],
+            'message': f'{detector.name} anomaly on {signal} (value {value:.2f}, score {score:.2f})'
+        }
+
+    def update(self, sample):
+        """Feed one sample (dict of signal -> value); O(1) per signal"""
+        timestamp = sample.get('timestamp')
+        self.samples_seen += 1
+        alerts = []
+
+        for signal, value in sample.items():
+            if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.number)):
+                continue
+            self.signal_samples[signal] = self.signal_samples.get(signal, 0) + 1
+            if not np.isfinite(value):
+                continue
+            for detector in self.detectors_for(signal):
+                score = detector.update(float(value))
+                if score is not None:
+                    alerts.append(self.build_alert(signal, detector, value, score, timestamp))
+
+        for alert in alerts:
+            self.recent_alerts.append(alert)
+            for listener in self.listeners:
+                try:
+                    listener(alert)
+                except Exception as e:
+                    self.logger.error(f"Alert listener failed: {e}")
+
+        return alerts
+
+    def alerts_since(self, samples):
+        """Alerts raised within the last given number of samples of their own signal"""
+        return [
+            alert for alert in self.recent_alerts
+            if alert['sample'] > self.signal_samples[alert['signal']] - samples
+        ]
+
+    def update_frame(self, frame):
+        """Feed a batch of samples in arrival order"""
+        alerts = []
+        for sample in frame.to_dict('records'):
+            alerts.extend(self.update(sample))
+        return alerts
+
+    def analyze(self, frame):
+        """Retrospective vectorized pass over a whole history with fresh detectors"""
+        rows = []
+        timestamps = frame['timestamp'] if 'timestamp' in frame else pd.Series(frame.index, index=frame.index)
+
+        for signal in frame.columns:
+            values = frame[signal]
+            if values.dtype == bool or not pd.api.types.is_numeric_dtype(values):
+                continue
+            factory = self.signal_detectors.get(signal, default_detectors)
+            for detector in factory():
+                scores = detector.batch(values).dropna()
+                for index, score in scores.items():
+                    rows.append({
+                        'timestamp': timestamps[index],
+                        'signal': signal,
+                        'detector': detector.name,
+                        'severity': detector.severity,
+                        'value': float(values[index]),
+                        'score': float(score)
+                    })
+
+        alerts = pd.DataFrame(rows, columns=['timestamp', 'signal', 'detector', 'severity',
+                                             'value', 'score'])
+        return alerts.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+class MQTTAlertPublisher:
+    """Alert listener that pushes each alert to an MQTT topic"""
+
+    def __init__(self, client, topic="electrolyzer/alerts"):
+        self.client = client
+        self.topic = topic
+
+    def __call__(self, alert):
+        self.client.publish(self.topic, json.dumps(alert, default=str))
@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from upper_layer_mpc import UpperLayerMPC
+
+# Columns expected in a replay trace (one row per control step)
+TRACE_COLUMNS = ['electricity_price', 'pv_power', 'oxygen_demand']
+
+
+class PlantModel:
+    """First-order production response with ramp and capacity limits"""
+
+    def __init__(self, initial_production=75.0, time_constant=0.25,
+                 max_production=100, min_production=10, max_ramp_rate=20):
+        self.production = initial_production
+        self.time_constant = time_constant  # hours
+        self.max_production = max_production
+        self.min_production = min_production
+        self.max_ramp_rate = max_ramp_rate  # kW/hour
+
+    def step(self, setpoint, dt):
+        """Advance the plant by dt hours towards the setpoint"""
+        setpoint = np.clip(setpoint, self.min_production, self.max_production)
+        change = (setpoint - self.production) * (1 - np.exp(-dt / self.time_constant))
+        max_change = self.max_ramp_rate * dt
+        self.production += float(np.clip(change, -max_change, max_change))
+        return self.production
+
+
+class IterationLimitReached(RuntimeError):
+    """Solver stopped at its iteration cap rather than failing outright"""
+
+
+class UpperLayerPolicy:
+    """Receding-horizon adapter around UpperLayerMPC"""
+
+    def __init__(self, horizon, dt, params=None):
+        self.mpc = UpperLayerMPC(connect_mqtt=False)
+        self.mpc.horizon = horizon
+        self.mpc.time_step = dt
+        for name, value in (params or {}).items():
+            setattr(self.mpc, name, value)
+
+    def solve(self, state, prices, pv, demand):
+        self.mpc.electricity_prices = prices
+        self.mpc.pv_forecast = pv
+        self.mpc.oxygen_demand_forecast = demand
+        result = self.mpc.optimize(state)
+        if result.success:
+            return np.asarray(result.x)
+        if result.status == 9:  # SLSQP: iteration limit reached
+            raise IterationLimitReached(result.message)
+        raise RuntimeError(result.message)
+
+    def pv_utilization(self, pv, applied):
+        self.mpc.pv_forecast = pv
+        return self.mpc.calculate_pv_utilization(applied)
+
+
+# EconomicMPC is not available: economic_mpc.py imports the missing ann_predict module
+POLICIES = {
+    'upper_layer': UpperLayerPolicy
+}
+
+
+def load_trace(filepath):
+    """Load a stored telemetry/price/PV trace from CSV"""
+    trace = pd.read_csv(filepath, parse_dates=['timestamp'], index_col='timestamp')
+    missing = [column for column in TRACE_COLUMNS if column not in trace.columns]
+    if missing:
+        raise ValueError(f"Trace is missing columns: {missing}")
+    return trace.sort_index()
+
+
+def synthetic_trace(days=30, step_minutes=15, seed=42):
+    """Generate a replay trace from the upper layer's mock daily profiles"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=days * 24 * 60 // step_minutes,
+                          freq=f'{step_minutes}min')
+    profiles = UpperLayerMPC(connect_mqtt=False)
+    hours = index.hour
+
+    trace = pd.DataFrame({
+        'electricity_price': np.asarray(profiles.load_electricity_prices())[hours],
+        'pv_power': np.asarray(profiles.load_pv_forecast())[hours],
+        'oxygen_demand': np.asarray(profiles.load_oxygen_demand())[hours]
+    }, index=index)
+    trace.index.name = 'timestamp'
+
+    trace['pv_power'] = np.maximum(0, trace['pv_power'] * rng.uniform(0.6, 1.1, len(trace)))
+    trace['oxygen_demand'] += rng.normal(0, 2, len(trace))
+    return trace
+
+
+def day_windows(trace):
+    """(start, stop) row positions of each calendar day in the trace"""
+    positions = np.flatnonzero(np.diff(trace.index.normalize().asi8, prepend=-1))
+    return [(int(start), int(stop)) for start, stop in zip(positions, np.append(positions[1:], len(trace)))]
+
+
+def run_backtest(job):
+    """Replay one execution window of the trace through the receding-horizon loop"""
+    trace = job['trace']
+    dt = job.get('dt') or (trace.index[1] - trace.index[0]).total_seconds() / 3600
+    # Lookahead matches the live controller's 24 hours regardless of the step size
+    horizon = job.get('horizon') or int(round(job.get('horizon_hours', 24) / dt))
+    params = job.get('params', {})
+    start, stop = job.get('window', (0, len(trace)))
+
+    policy = POLICIES[job.get('policy', 'upper_layer')](horizon, dt, params)
+    plant = PlantModel(initial_production=job.get('initial_production', 75.0), **job.get('plant', {}))
+
+    # Forecasts come from the full trace, padded only past its final sample
+    columns = {
+        column: np.pad(trace[column].to_numpy(dtype=float), (0, horizon), mode='edge')
+        for column in TRACE_COLUMNS
+    }
+
+    # Replay the hours before the window (unscored) so the plant state carries over
+    warmup = min(start, int(round(job.get('warmup_hours', 6) / dt)))
+    first = start - warmup
+
+    steps = stop - start
+    produced = np.zeros(steps)
+    solve_times = np.zeros(steps)
+    failures = 0
+    iteration_limits = 0
+    shifted = None
+
+    for k in range(first, stop):
+        prices = columns['electricity_price'][k:k + horizon]
+        pv = columns['pv_power'][k:k + horizon]
+        demand = columns['oxygen_demand'][k:k + horizon]
+        state = {'production': plant.production}
+        scored = k >= start
+
+        solve_start = time.perf_counter()
+        try:
+            schedule = policy.solve(state, prices, pv, demand)
+        except RuntimeError as e:
+            # Fall back to the previous schedule shifted by one step
+            if isinstance(e, IterationLimitReached):
+                iteration_limits += scored
+            else:
+                failures += scored
+            schedule = shifted if shifted is not None else np.full(horizon, plant.production)
+        elapsed = time.perf_counter() - solve_start
+
+        shifted = np.append(schedule[1:], schedule[-1])
+        production = plant.step(schedule[0], dt)
+        if scored:
+            produced[k - start] = production
+            solve_times[k - start] = elapsed
+
+    prices = columns['electricity_price'][start:stop]
+    pv = columns['pv_power'][start:stop]
+    demand = columns['oxygen_demand'][start:stop]
+    grid_power = np.maximum(0, produced - pv)
+
+    return {
+        'name': job.get('name'),
+        'params': params,
+        'start': str(trace.index[start]),
+        'steps': steps,
+        'horizon': horizon,
+        'energy_cost': float((grid_power * prices).sum() * dt),
+        'energy_consumed': float(produced.sum() * dt),
+        'pv_utilization': float(policy.pv_utilization(pv, produced)),
+        'demand_shortfall': float(np.maximum(0, demand - produced).sum() * dt),
+        'shortfall_steps': int((produced < demand).sum()),
+        'solver_failures': int(failures),
+        'iteration_limit_exits': int(iteration_limits),
+        'solve_times': solve_times.tolist()
+    }
+
+
+def run_parallel(jobs, max_workers=None):
+    """Run independent backtest jobs across processes"""
+    max_workers = max_workers or os.cpu_count()
+    if max_workers == 1 or len(jobs) == 1:
+        return [run_backtest(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_backtest, jobs))
+
+
+def build_jobs(trace, parameter_sets=None, policy='upper_layer', horizon_hours=24,
+               warmup_hours=6):
+    """One job per day per parameter set; each job sees the full trace for lookahead"""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown backtest policy '{policy}', available: {sorted(POLICIES)}")
+    parameter_sets = parameter_sets or [{}]
+    return [
+        {
+            'name': f"{trace.index[start].date()}#{i}",
+            'trace': trace,
+            'window': (start, stop),
+            'policy': policy,
+            'horizon_hours': horizon_hours,
+            'warmup_hours': warmup_hours,
+            'params': params
+        }
+        for i, params in enumerate(parameter_sets)
+        for start, stop in day_windows(trace)
+    ]
+
+
+def summarize(results):
+    """Aggregate per-day results for each parameter set"""
+    frame = pd.DataFrame(results)
+    frame['param_set'] = frame['params'].apply(lambda p: json.dumps(p, sort_keys=True))
+
+    summary = frame.groupby('param_set').agg(
+        days=('steps', 'size'),
+        steps=('steps', 'sum'),
+        energy_cost=('energy_cost', 'sum'),
+        energy_consumed=('energy_consumed', 'sum'),
+        pv_utilization=('pv_utilization', 'mean'),
+        demand_shortfall=('demand_shortfall', 'sum'),
+        solver_failures=('solver_failures', 'sum'),
+        iteration_limit_exits=('iteration_limit_exits', 'sum')
+    )
+
+    # Solve-time statistics over the pooled per-step times, not per-day aggregates
+    solve_times = frame.groupby('param_set')['solve_times'].agg(lambda times: np.concatenate(times.to_list()))
+    summary['solve_time_mean'] = solve_times.apply(np.mean)
+    summary['solve_time_p95'] = solve_times.apply(lambda times: np.percentile(times, 95))
+    summary['solve_time_max'] = solve_times.apply(np.max)
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    trace = synthetic_trace(days=30, step_minutes=15)
+    jobs = build_jobs(trace, parameter_sets=[{}, {'max_ramp_rate': 10}])
+
+    start = time.time()
+    results = run_parallel(jobs)
+    print(f"Replayed {len(trace)} steps x {len(jobs) // len(day_windows(trace))} parameter sets "
+          f"in {time.time() - start:.1f}s")
+    print(summarize(results).to_string())
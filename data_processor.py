@@ -3,12 +3,37 @@ import numpy as np
 from datetime import datetime, timedelta
 import json
 import logging
+from anomaly_detection import StreamingAnomalyDetector, MQTTAlertPublisher
+
+# Wire key -> column name for the binary telemetry schemas
+SIMULINK_COLUMNS = {
+    'o2Production': 'o2_production',
+    'efficiency': 'efficiency',
+    'safetyMargin': 'safety_margin',
+    'temperature': 'stack_temperature',
+    'pressure': 'system_pressure',
+    'pvPower': 'pv_power',
+    'gridPower': 'grid_power'
+}
+
+ARDUINO_COLUMNS = {
+    'safetySetpoint': 'safety_setpoint',
+    'actualProduction': 'actual_production',
+    'constraintsViolated': 'constraints_violated',
+    'emergencyProtocol': 'emergency_protocol',
+    'qpSolveTime': 'qp_solve_time'
+}
 
 class DataProcessor:
-    def __init__(self):
+    def __init__(self, mqtt_client=None):
         self.historical_data = pd.DataFrame()
         self.real_time_data = {}
         self.logger = logging.getLogger(__name__)
+        
+        # Streaming anomaly detection, alerts pushed on MQTT when a client is given
+        self.anomaly_detector = StreamingAnomalyDetector()
+        if mqtt_client is not None:
+            self.anomaly_detector.add_listener(MQTTAlertPublisher(mqtt_client))
 
     def process_simulink_data(self, raw_data):
         """Process data received from Simulink"""
@@ -30,6 +55,8 @@ class DataProcessor:
             # Add to historical data
             self.update_historical_data(processed)
             
+            self.anomaly_detector.update(processed)
+            
             return processed
             
         except Exception as e:
@@ -49,15 +76,60 @@ class DataProcessor:
             }
             
             self.real_time_data.update(processed)
+            self.anomaly_detector.update(processed)
             return processed
             
         except Exception as e:
             self.logger.error(f"Error processing Arduino data: {e}")
             return None
 
+    def samples_to_frame(self, samples, columns):
+        """Convert a decoded binary batch (structured array) into a DataFrame"""
+        frame = pd.DataFrame({
+            column: samples[key].astype(float) for key, column in columns.items()
+        })
+        frame.insert(0, 'timestamp', [datetime.fromtimestamp(t) for t in samples['timestamp']])
+        return frame
+
+    def process_simulink_batch(self, samples):
+        """Process a batch of binary Simulink samples in one pass"""
+        try:
+            frame = self.samples_to_frame(samples, SIMULINK_COLUMNS)
+            if frame.empty:
+                return frame
+            
+            self.real_time_data.update(frame.iloc[-1].to_dict())
+            self.update_historical_data(frame)
+            self.anomaly_detector.update_frame(frame)
+            
+            return frame
+            
+        except Exception as e:
+            self.logger.error(f"Error processing Simulink batch: {e}")
+            return None
+
+    def process_arduino_batch(self, samples):
+        """Process a batch of binary Arduino samples in one pass"""
+        try:
+            frame = self.samples_to_frame(samples, ARDUINO_COLUMNS)
+            for column in ('constraints_violated', 'emergency_protocol'):
+                frame[column] = frame[column].astype(bool)
+            
+            if not frame.empty:
+                self.real_time_data.update(frame.iloc[-1].to_dict())
+            self.anomaly_detector.update_frame(frame)
+            return frame
+            
+        except Exception as e:
+            self.logger.error(f"Error processing Arduino batch: {e}")
+            return None
+
     def update_historical_data(self, new_data):
-        """Update historical data DataFrame"""
-        new_row = pd.DataFrame([new_data])
+        """Update historical data DataFrame with a sample dict or a batch DataFrame"""
+        if isinstance(new_data, pd.DataFrame):
+            new_row = new_data
+        else:
+            new_row = pd.DataFrame([new_data])
         
         if self.historical_data.empty:
             self.historical_data = new_row
@@ -112,7 +184,7 @@ class DataProcessor:
     def calculate_reliability(self, data):
         """Calculate system reliability percentage"""
         total_hours = len(data)
-        reliable_hours = data[data['safety_margin'] > 5].shape[0
+        reliable_hours = data[data['safety_margin'] > 5].shape[0]
         return (reliable_hours / total_hours * 100) if total_hours > 0 else 0
 
     def generate_forecast(self, hours=24):
@@ -169,36 +241,15 @@ class DataProcessor:
             'pv_power': pv_power
         }
 
-    def detect_anomalies(self):
-        """Detect anomalies in system operation"""
+    def detect_anomalies(self, window=6):
+        """Return alerts raised by the streaming detector over the last few samples of each signal"""
+        return self.anomaly_detector.alerts_since(window)
+
+    def analyze_history(self):
+        """Run the anomaly detectors over the full historical data in one vectorized pass"""
         if self.historical_data.empty:
-            return []
-        
-        recent_data = self.historical_data.tail(6)  # Last 6 data points
-        
-        anomalies = []
-        
-        # Check for sudden efficiency drops
-        efficiency_std = recent_data['efficiency'].std()
-        efficiency_mean = recent_data['efficiency'].mean()
-        
-        if efficiency_std > 5:  # High variability
-            anomalies.append({
-                'type': 'efficiency_instability',
-                'severity': 'medium',
-                'message': 'High variability in system efficiency detected'
-            })
-        
-        # Check for safety margin violations
-        low_safety = recent_data[recent_data['safety_margin'] < 10]
-        if not low_safety.empty:
-            anomalies.append({
-                'type': 'low_safety_margin',
-                'severity': 'high',
-                'message': f'Safety margin below threshold {len(low_safety)} times'
-            })
-        
-        return anomalies
+            return pd.DataFrame()
+        return self.anomaly_detector.analyze(self.historical_data)
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+import numpy as np
+import multiprocessing
+import threading
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from queue import Empty
+from upper_layer_mpc import UpperLayerMPC
+
+# UpperLayerMPC attributes copied into the solver process for each solve
+PROBLEM_ATTRIBUTES = [
+    'horizon', 'time_step', 'electricity_prices', 'pv_forecast',
+    'oxygen_demand_forecast', 'max_production', 'min_production', 'max_ramp_rate'
+]
+
+# How often solve() checks that the solver process is still alive while waiting
+WORKER_POLL_INTERVAL = 0.5  # seconds
+
+
+def solve_worker(tasks, results):
+    """Solver process: for each task stream every improving feasible iterate, then the final result
+
+    A solve that raises reports ('error', repr(e)) and the process keeps serving tasks.
+    """
+    mpc = UpperLayerMPC(connect_mqtt=False)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        solve_id, parameters, current_state = task
+        best_cost = [np.inf]
+
+        def report(xk):
+            if mpc.is_feasible(xk, current_state):
+                cost = float(mpc.objective_function(xk, current_state))
+                if cost < best_cost[0]:
+                    best_cost[0] = cost
+                    results.put((solve_id, ('iterate', xk.tolist(), cost)))
+
+        try:
+            for name, value in parameters.items():
+                setattr(mpc, name, value)
+            result = mpc.optimize(current_state, callback=report)
+        except Exception as e:
+            results.put((solve_id, ('error', repr(e))))
+            continue
+        results.put((solve_id, ('result', result.x.tolist(), float(result.fun), bool(result.success),
+                                str(result.message), int(result.nit))))
+
+
+class DeadlineScheduler:
+    def __init__(self, mpc, upper_deadline=60.0, upper_period=900.0, lower_period=1.0,
+                 lower_step=None, max_records=1000):
+        self.mpc = mpc
+        self.upper_deadline = upper_deadline  # seconds
+        self.upper_period = upper_period      # seconds (15 min)
+        self.lower_period = lower_period      # seconds
+        # Called every lower_period with the active economic setpoint; this is where a
+        # lower-layer safety-setpoint computation plugs in
+        self.lower_step = lower_step
+        self.solve_records = deque(maxlen=max_records)
+
+        self.active_schedule = None
+        self.schedule_issued_at = None
+        self.schedule_lock = threading.Lock()
+
+        # Never fork: the MQTT loop and lower-layer threads may hold locks at fork time.
+        # The worker is long-lived so the spawn/import cost is not paid on every solve.
+        self.context = multiprocessing.get_context('spawn')
+        self.worker = None
+        self.tasks = None
+        self.results = None
+        self.solve_count = 0
+        self.trigger_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.logger = logging.getLogger(__name__)
+
+    def start_worker(self):
+        """Start a fresh solver process with its own queues"""
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.worker = self.context.Process(
+            target=solve_worker, args=(self.tasks, self.results), daemon=True
+        )
+        self.worker.start()
+
+    def stop_worker(self):
+        if self.worker is None:
+            return
+        if self.worker.is_alive():
+            self.worker.terminate()
+        self.worker.join()
+        self.worker = None
+
+    def solve(self, current_state):
+        """Run one upper-layer solve against the deadline; always returns a schedule"""
+        if self.worker is None or not self.worker.is_alive():
+            self.start_worker()
+
+        self.solve_count += 1
+        parameters = {name: getattr(self.mpc, name) for name in PROBLEM_ATTRIBUTES}
+
+        start = time.monotonic()
+        deadline = start + self.upper_deadline
+        self.tasks.put((self.solve_count, parameters, current_state))
+
+        best_iterate = None
+        final = None
+        while final is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                solve_id, message = self.results.get(timeout=min(remaining, WORKER_POLL_INTERVAL))
+            except Empty:
+                if not self.worker.is_alive():
+                    final = ('error', f"Solver process exited with code {self.worker.exitcode}")
+                continue
+            if solve_id != self.solve_count:
+                continue
+            if message[0] == 'iterate':
+                best_iterate = message
+            else:
+                final = message
+
+        elapsed = time.monotonic() - start
+        if final is None or not self.worker.is_alive():
+            # The solve overran or the process died: have a replacement warm before the next cycle
+            self.stop_worker()
+            self.start_worker()
+
+        setpoints, source, message = self.select_schedule(current_state, best_iterate, final)
+        # A failed solve still gets a fallback schedule but is reported as an error
+        outcome = 'error' if final is not None and final[0] == 'error' else source
+        schedule = self.mpc.format_solution(np.asarray(setpoints), current_state)
+        schedule['constraints_satisfied'] = self.mpc.is_feasible(setpoints, current_state)
+        schedule['solver_outcome'] = outcome
+
+        self.record_solve(outcome, elapsed, final, message, source)
+        return schedule
+
+    def select_schedule(self, current_state, best_iterate, final):
+        """Converged result, else best feasible iterate, else shifted previous schedule, else hold"""
+        if final is None:
+            message = f"Deadline of {self.upper_deadline:.2f}s exceeded"
+        elif final[0] == 'error':
+            message = final[1]
+        else:
+            _, x, cost, success, message, _ = final
+            if success:
+                return x, 'converged', message
+            if self.mpc.is_feasible(x, current_state) and \
+                    (best_iterate is None or cost <= best_iterate[2]):
+                best_iterate = ('iterate', x, cost)
+
+        if best_iterate is not None:
+            return best_iterate[1], 'best_iterate', message
+
+        shifted = self.shifted_schedule()
+        if shifted is not None:
+            return shifted, 'shifted_schedule', message
+
+        hold = np.clip(current_state['production'], self.mpc.min_production, self.mpc.max_production)
+        return np.full(self.mpc.horizon, hold), 'hold', message
+
+    def shifted_schedule(self):
+        """Previous schedule advanced by the steps elapsed since it was issued"""
+        with self.schedule_lock:
+            if self.active_schedule is None:
+                return None
+            setpoints = list(self.active_schedule['setpoints'])
+            issued_at = self.schedule_issued_at
+
+        steps = int((time.monotonic() - issued_at) / (self.mpc.time_step * 3600))
+        steps = min(steps, len(setpoints) - 1)
+        shifted = setpoints[steps:] + [setpoints[-1]] * steps
+        return np.clip(shifted[:self.mpc.horizon], self.mpc.min_production, self.mpc.max_production)
+
+    def record_solve(self, outcome, elapsed, final, message, source):
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            'outcome': outcome,
+            'schedule_source': source,
+            'elapsed': elapsed,
+            'deadline': self.upper_deadline,
+            'deadline_missed': final is None,
+            'iterations': final[5] if final is not None and final[0] == 'result' else None,
+            'message': message
+        }
+        self.solve_records.append(record)
+        if outcome == 'error':
+            self.logger.error(f"Upper-layer solve failed after {elapsed:.2f}s, using {source}: {message}")
+        elif outcome != 'converged':
+            self.logger.warning(f"Upper-layer solve {outcome} after {elapsed:.2f}s: {message}")
+
+    def deadline_statistics(self):
+        """Summary of recorded solves for analysis"""
+        records = list(self.solve_records)
+        elapsed = np.array([record['elapsed'] for record in records])
+        outcomes = {}
+        for record in records:
+            outcomes[record['outcome']] = outcomes.get(record['outcome'], 0) + 1
+        return {
+            'solves': len(records),
+            'deadline_misses': sum(record['deadline_missed'] for record in records),
+            'outcomes': outcomes,
+            'elapsed_mean': float(elapsed.mean()) if len(records) else 0.0,
+            'elapsed_max': float(elapsed.max()) if len(records) else 0.0
+        }
+
+    def activate(self, schedule):
+        with self.schedule_lock:
+            self.active_schedule = schedule
+            self.schedule_issued_at = time.monotonic()
+
+    def active_setpoint(self):
+        """Setpoint of the active schedule for the current upper-layer step"""
+        with self.schedule_lock:
+            if self.active_schedule is None:
+                return None
+            setpoints = self.active_schedule['setpoints']
+            issued_at = self.schedule_issued_at
+        step = int((time.monotonic() - issued_at) / (self.mpc.time_step * 3600))
+        return setpoints[min(step, len(setpoints) - 1)]
+
+    def run_upper_layer(self):
+        """Upper-layer cadence: solve, publish and activate every upper_period"""
+        while not self.stop_event.is_set():
+            try:
+                schedule = self.solve(self.mpc.get_current_state())
+                self.activate(schedule)
+                self.mpc.send_to_lower_layer(schedule)
+                self.mpc.log_optimization_results(schedule)
+            except Exception as e:
+                self.logger.error(f"Upper-layer cycle failed: {e}")
+
+            # Sleep until the next period or an explicit RUN_OPTIMIZATION trigger
+            self.trigger_event.wait(self.upper_period)
+            self.trigger_event.clear()
+
+    def run_lower_layer(self):
+        """Lower-layer cadence: runs lower_step on a fixed period, independent of upper-layer solve time"""
+        next_tick = time.monotonic()
+        while not self.stop_event.is_set():
+            setpoint = self.active_setpoint()
+            if setpoint is not None and self.lower_step is not None:
+                try:
+                    self.lower_step(setpoint)
+                except Exception as e:
+                    self.logger.error(f"Lower-layer step failed: {e}")
+
+            next_tick += self.lower_period
+            self.stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+    def trigger(self):
+        """Request an upper-layer solve ahead of the next period"""
+        self.trigger_event.set()
+
+    def start(self):
+        self.stop_event.clear()
+        if self.worker is None:
+            self.start_worker()
+        self.threads = [
+            threading.Thread(target=self.run_upper_layer, name='upper-layer', daemon=True),
+            threading.Thread(target=self.run_lower_layer, name='lower-layer', daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.trigger_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.stop_worker()
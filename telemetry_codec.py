@@ -0,0 +1,180 @@
+import numpy as np
+import struct
+import json
+import logging
+
+JSON_CONTENT_TYPE = 'application/json'
+BINARY_CONTENT_TYPE = 'application/x-electrolyzer-telemetry'
+
+# Peers announce the content types they can read for a topic here
+NEGOTIATION_TOPIC = "electrolyzer/codec/accept"
+
+# Header: magic, schema id, schema version, number of samples in the batch
+MAGIC = b'EZ'
+HEADER = struct.Struct('<2sBBH')
+
+
+class TelemetrySchema:
+    def __init__(self, schema_id, version, fields):
+        self.schema_id = schema_id
+        self.version = version
+        self.fields = fields  # (wire key, vector length or None) pairs
+        self.dtype = np.dtype([
+            (key, '<f8') if length is None else (key, '<f8', (length,))
+            for key, length in fields
+        ])
+
+    @property
+    def keys(self):
+        return [key for key, _ in self.fields]
+
+    def to_array(self, records):
+        """Pack a list of JSON-style samples into a structured array"""
+        samples = np.zeros(len(records), dtype=self.dtype)
+        for i, record in enumerate(records):
+            # A missing timestamp would encode as epoch 0 and be dropped downstream
+            if 'timestamp' not in record:
+                raise ValueError(f"Schema {self.schema_id} v{self.version} sample has no 'timestamp'")
+            for key, length in self.fields:
+                value = record.get(key, 0)
+                if length is not None and np.size(value) != length:
+                    raise ValueError(
+                        f"Schema {self.schema_id} v{self.version} expects {length} values "
+                        f"for '{key}', got {np.size(value)}"
+                    )
+                samples[key][i] = value
+        return samples
+
+
+# Keys match the existing JSON payloads so both encodings share one vocabulary
+SIMULINK_SCHEMA = TelemetrySchema(1, 1, [
+    ('timestamp', None),
+    ('o2Production', None),
+    ('efficiency', None),
+    ('safetyMargin', None),
+    ('temperature', None),
+    ('pressure', None),
+    ('pvPower', None),
+    ('gridPower', None)
+])
+
+ARDUINO_SCHEMA = TelemetrySchema(2, 1, [
+    ('timestamp', None),
+    ('safetySetpoint', None),
+    ('actualProduction', None),
+    ('constraintsViolated', None),
+    ('emergencyProtocol', None),
+    ('qpSolveTime', None)
+])
+
+# Fixed to the live 24-step horizon; other horizons fall back to JSON
+SCHEDULE_SCHEMA = TelemetrySchema(3, 1, [
+    ('timestamp', None),
+    ('timeStep', None),
+    ('totalCost', None),
+    ('pvUtilization', None),
+    ('setpoints', 24)
+])
+
+SETPOINT_SCHEMA = TelemetrySchema(4, 1, [
+    ('timestamp', None),
+    ('setpoint', None)
+])
+
+SCHEMAS = {
+    (schema.schema_id, schema.version): schema
+    for schema in (SIMULINK_SCHEMA, ARDUINO_SCHEMA, SCHEDULE_SCHEMA, SETPOINT_SCHEMA)
+}
+
+
+class TelemetryCodec:
+    def __init__(self):
+        self.preferred_content_types = {}
+        self.expected_readers = {}        # topic -> peers that must accept binary
+        self.accepted_content_types = {}  # topic -> {peer: [content types]}
+        self.logger = logging.getLogger(__name__)
+
+    def prefer(self, topic, content_type, readers=()):
+        """Set the encoding this node would like to publish on a topic"""
+        self.preferred_content_types[topic] = content_type
+        # Known consumers of the topic; each stays JSON-only until it announces binary
+        self.expected_readers[topic] = set(readers)
+
+    def handle_accept(self, data):
+        """Record a peer's accepted content types for a topic"""
+        topic = data.get('topic')
+        peer = data.get('peer', 'unknown')
+        if topic is None:
+            return
+        self.accepted_content_types.setdefault(topic, {})[peer] = list(
+            data.get('contentTypes', [JSON_CONTENT_TYPE])
+        )
+
+    def announce(self, client, peer, topics):
+        """Tell publishers that this node can read binary on the given topics"""
+        for topic in topics:
+            client.publish(NEGOTIATION_TOPIC, json.dumps({
+                'topic': topic,
+                'peer': peer,
+                'contentTypes': [BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE]
+            }))
+
+    def content_type(self, topic):
+        """Negotiated content type: binary only if preferred and every reader has opted in"""
+        preferred = self.preferred_content_types.get(topic, JSON_CONTENT_TYPE)
+        if preferred != BINARY_CONTENT_TYPE:
+            return JSON_CONTENT_TYPE
+        announced = self.accepted_content_types.get(topic, {})
+        if not announced:
+            return JSON_CONTENT_TYPE
+        # Readers that have not announced are assumed to be JSON-only
+        readers = {peer: [JSON_CONTENT_TYPE] for peer in self.expected_readers.get(topic, ())}
+        readers.update(announced)
+        if all(BINARY_CONTENT_TYPE in accepted for accepted in readers.values()):
+            return BINARY_CONTENT_TYPE
+        return JSON_CONTENT_TYPE
+
+    def encode(self, schema, samples):
+        """Encode one or more samples into a single binary message"""
+        if not isinstance(samples, np.ndarray):
+            samples = schema.to_array(samples)
+        samples = np.ascontiguousarray(samples, dtype=schema.dtype)
+        header = HEADER.pack(MAGIC, schema.schema_id, schema.version, len(samples))
+        return header + samples.tobytes()
+
+    def encode_for_topic(self, topic, schema, samples, message):
+        """Encode for a topic, falling back to the JSON message when binary is not negotiated"""
+        if self.content_type(topic) == BINARY_CONTENT_TYPE:
+            try:
+                return self.encode(schema, samples)
+            except ValueError as e:
+                self.logger.error(f"Binary encoding failed on {topic}, sending JSON: {e}")
+        return json.dumps(message)
+
+    def is_binary(self, payload):
+        return isinstance(payload, (bytes, bytearray)) and payload[:2] == MAGIC
+
+    def decode(self, payload):
+        """Decode a payload into a structured NumPy array (binary) or a dict (JSON)"""
+        if not self.is_binary(payload):
+            if isinstance(payload, (bytes, bytearray)):
+                payload = payload.decode()
+            return json.loads(payload)
+
+        if len(payload) < HEADER.size:
+            raise ValueError("Truncated telemetry header")
+        _, schema_id, version, count = HEADER.unpack_from(payload)
+        schema = SCHEMAS.get((schema_id, version))
+        if schema is None:
+            raise ValueError(f"Unknown telemetry schema {schema_id} v{version}")
+        expected = HEADER.size + count * schema.dtype.itemsize
+        if len(payload) != expected:
+            raise ValueError(f"Telemetry payload is {len(payload)} bytes, expected {expected}")
+        return np.frombuffer(payload, dtype=schema.dtype, count=count, offset=HEADER.size)
+
+    def to_records(self, samples):
+        """Convert decoded samples back to JSON-style dicts"""
+        return [
+            {key: samples[key][i].tolist() for key in samples.dtype.names}
+            for i in range(len(samples))
+        ]
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+from anomaly_detection import (
+    EWMAZScoreDetector, CUSUMDetector, RateOfChangeDetector, ThresholdDetector,
+    StreamingAnomalyDetector
+)
+from data_processor import DataProcessor
+
+
+def seeded_series(n=2000, seed=7):
+    rng = np.random.default_rng(seed)
+    values = 50 + rng.normal(0, 1, n)
+    values[500:] += 3
+    values[1500:] += 3
+    values[800] -= 15
+    values[1200] = np.nan
+    return pd.Series(values)
+
+
+def streaming_scores(detector, values):
+    scores = {}
+    for index, value in values.dropna().items():
+        score = detector.update(float(value))
+        if score is not None:
+            scores[index] = score
+    return scores
+
+
+@pytest.mark.parametrize('factory', [
+    lambda: EWMAZScoreDetector(),
+    lambda: CUSUMDetector(),
+    lambda: CUSUMDetector(target=50, sigma=1),
+    lambda: RateOfChangeDetector(),
+    lambda: RateOfChangeDetector(max_change=5),
+    lambda: ThresholdDetector(lower=40, upper=55)
+])
+def test_batch_matches_streaming(factory):
+    values = seeded_series()
+    expected = streaming_scores(factory(), values)
+    batch = factory().batch(values).dropna()
+
+    assert expected
+    assert list(batch.index) == list(expected)
+    np.testing.assert_allclose(batch.to_numpy(), list(expected.values()))
+
+
+def test_cusum_alerts_on_every_shift():
+    alarms = list(streaming_scores(CUSUMDetector(), seeded_series()))
+
+    assert any(500 <= index < 600 for index in alarms)
+    assert any(1500 <= index < 1600 for index in alarms)
+
+
+def test_detect_window_excludes_old_alerts():
+    engine = StreamingAnomalyDetector({'safety_margin': lambda: [ThresholdDetector(lower=10)]})
+    engine.update({'safety_margin': 5.0})
+    for _ in range(6):
+        engine.update({'safety_margin': 20.0})
+
+    assert len(engine.recent_alerts) == 1
+    assert engine.alerts_since(6) == []
+    assert len(engine.alerts_since(7)) == 1
+
+
+def test_detect_window_counts_each_source_separately():
+    processor = DataProcessor()
+    processor.process_simulink_data({'safetyMargin': 5.0, 'efficiency': 70.0})
+    for _ in range(6):
+        processor.process_arduino_data({'safetySetpoint': 50.0, 'actualProduction': 50.0})
+
+    alerts = processor.detect_anomalies()
+    assert [alert['type'] for alert in alerts] == ['safety_margin_threshold']
+
+    for _ in range(6):
+        processor.process_simulink_data({'safetyMargin': 20.0, 'efficiency': 70.0})
+    assert processor.detect_anomalies() == []
+
+
+def test_schedule_steps_do_not_alert():
+    engine = StreamingAnomalyDetector()
+    for setpoint in np.repeat([40.0, 75.0, 20.0, 90.0], 60):
+        engine.update({'o2_production': setpoint, 'safety_setpoint': setpoint,
+                       'actual_production': setpoint})
+
+    assert list(engine.recent_alerts) == []
@@ -0,0 +1,149 @@
+import time
+import numpy as np
+import pytest
+from upper_layer_mpc import UpperLayerMPC
+from mpc_scheduler import DeadlineScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = DeadlineScheduler(UpperLayerMPC(connect_mqtt=False), upper_deadline=30.0)
+    yield scheduler
+    scheduler.stop_worker()
+
+
+def attach_idle_worker(scheduler, seconds=60):
+    """Stand in for the solver with a process that never answers"""
+    scheduler.stop_worker()
+    scheduler.tasks = scheduler.context.Queue()
+    scheduler.results = scheduler.context.Queue()
+    scheduler.worker = scheduler.context.Process(target=time.sleep, args=(seconds,), daemon=True)
+    scheduler.worker.start()
+
+
+def solve_message(scheduler, x, success=True):
+    x = list(map(float, x))
+    cost = float(scheduler.mpc.objective_function(np.asarray(x), {'production': x[0]}))
+    return ('result', x, cost, success, 'Optimization terminated successfully', 10)
+
+
+def test_converged(scheduler):
+    current_state = {'production': 50.0}
+    schedule = scheduler.solve(current_state)
+    record = scheduler.solve_records[-1]
+
+    assert schedule['solver_outcome'] == 'converged'
+    assert schedule['constraints_satisfied']
+    assert record['schedule_source'] == 'converged'
+    assert not record['deadline_missed']
+    assert record['iterations'] > 0
+
+
+def test_best_iterate_on_deadline(scheduler):
+    attach_idle_worker(scheduler)
+    setpoints = np.full(scheduler.mpc.horizon, 50.0)
+    scheduler.results.put((1, ('iterate', setpoints.tolist(), 123.0)))
+    scheduler.upper_deadline = 0.5
+
+    schedule = scheduler.solve({'production': 50.0})
+
+    assert schedule['solver_outcome'] == 'best_iterate'
+    assert schedule['setpoints'] == setpoints.tolist()
+    assert scheduler.solve_records[-1]['deadline_missed']
+
+
+def test_shifted_schedule_on_deadline(scheduler):
+    previous = {'setpoints': list(np.linspace(20, 60, scheduler.mpc.horizon))}
+    scheduler.activate(previous)
+    attach_idle_worker(scheduler)
+    scheduler.upper_deadline = 0.2
+
+    schedule = scheduler.solve({'production': 20.0})
+
+    assert schedule['solver_outcome'] == 'shifted_schedule'
+    np.testing.assert_allclose(schedule['setpoints'], previous['setpoints'])
+
+
+def test_hold_without_any_schedule(scheduler):
+    attach_idle_worker(scheduler)
+    scheduler.upper_deadline = 0.2
+
+    schedule = scheduler.solve({'production': 150.0})
+
+    assert schedule['solver_outcome'] == 'hold'
+    assert schedule['setpoints'] == [scheduler.mpc.max_production] * scheduler.mpc.horizon
+
+
+def test_stale_results_are_ignored(scheduler):
+    attach_idle_worker(scheduler)
+    stale = solve_message(scheduler, np.full(scheduler.mpc.horizon, 80.0))
+    scheduler.results.put((0, ('iterate', stale[1], stale[2])))
+    scheduler.results.put((0, stale))
+    scheduler.upper_deadline = 0.5
+
+    schedule = scheduler.solve({'production': 30.0})
+
+    assert schedule['solver_outcome'] == 'hold'
+    assert schedule['setpoints'] == [30.0] * scheduler.mpc.horizon
+
+
+def test_failed_result_falls_back_to_best_iterate(scheduler):
+    attach_idle_worker(scheduler)
+    horizon = scheduler.mpc.horizon
+    better = np.full(horizon, 50.0)
+    worse = solve_message(scheduler, np.full(horizon, 90.0), success=False)
+    scheduler.results.put((1, ('iterate', better.tolist(), worse[2] - 1)))
+    scheduler.results.put((1, worse))
+
+    schedule = scheduler.solve({'production': 50.0})
+    record = scheduler.solve_records[-1]
+
+    assert schedule['solver_outcome'] == 'best_iterate'
+    assert schedule['setpoints'] == better.tolist()
+    assert not record['deadline_missed']
+    assert record['iterations'] == 10
+
+
+def test_solver_exception_is_reported_as_error(scheduler):
+    # Inverted bounds make SLSQP raise inside the solver process
+    scheduler.mpc.min_production, scheduler.mpc.max_production = 60, 40
+
+    schedule = scheduler.solve({'production': 50.0})
+    record = scheduler.solve_records[-1]
+
+    assert schedule['solver_outcome'] == 'error'
+    assert record['schedule_source'] == 'hold'
+    assert not record['deadline_missed']
+    assert 'ValueError' in record['message']
+    assert record['elapsed'] < scheduler.upper_deadline
+    # The worker survives the exception and serves the next solve
+    scheduler.mpc.min_production, scheduler.mpc.max_production = 10, 100
+    assert scheduler.solve({'production': 50.0})['solver_outcome'] == 'converged'
+
+
+def test_dead_worker_is_reported_as_error(scheduler):
+    attach_idle_worker(scheduler, seconds=0.5)
+
+    schedule = scheduler.solve({'production': 50.0})
+    record = scheduler.solve_records[-1]
+
+    assert schedule['solver_outcome'] == 'error'
+    assert not record['deadline_missed']
+    assert 'exited' in record['message']
+    assert record['elapsed'] < scheduler.upper_deadline
+    assert scheduler.worker.is_alive()
+
+
+def test_deadline_statistics(scheduler):
+    scheduler.solve({'production': 50.0})
+    attach_idle_worker(scheduler)
+    scheduler.upper_deadline = 0.2
+    scheduler.solve({'production': 50.0})
+
+    statistics = scheduler.deadline_statistics()
+
+    assert statistics['solves'] == 2
+    assert statistics['deadline_misses'] == 1
+    assert statistics['outcomes'] == {'converged': 1, 'hold': 1}
+    assert statistics['elapsed_max'] >= 0.2
+    assert statistics['elapsed_mean'] <= statistics['elapsed_max']
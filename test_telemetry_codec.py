@@ -0,0 +1,101 @@
+import json
+import numpy as np
+import pytest
+from telemetry_codec import (
+    TelemetryCodec, SIMULINK_SCHEMA, ARDUINO_SCHEMA, SCHEDULE_SCHEMA, SETPOINT_SCHEMA,
+    BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE, HEADER, MAGIC
+)
+
+TOPIC = "electrolyzer/he-nmpc/lower_commands"
+
+
+def sample_for(schema, seed):
+    rng = np.random.default_rng(seed)
+    return {
+        key: rng.uniform(0, 100, length).tolist() if length else float(rng.uniform(0, 100))
+        for key, length in schema.fields
+    }
+
+
+@pytest.mark.parametrize('schema', [SIMULINK_SCHEMA, ARDUINO_SCHEMA, SCHEDULE_SCHEMA, SETPOINT_SCHEMA])
+@pytest.mark.parametrize('count', [1, 5])
+def test_round_trip(schema, count):
+    codec = TelemetryCodec()
+    records = [sample_for(schema, seed) for seed in range(count)]
+
+    payload = codec.encode(schema, records)
+    samples = codec.decode(payload)
+
+    assert codec.is_binary(payload)
+    assert isinstance(samples, np.ndarray) and len(samples) == count
+    assert codec.to_records(samples) == records
+
+
+def test_json_passes_through():
+    assert TelemetryCodec().decode(b'{"command": "RUN_OPTIMIZATION"}') == {'command': 'RUN_OPTIMIZATION'}
+
+
+def test_truncated_header_rejected():
+    with pytest.raises(ValueError, match="Truncated telemetry header"):
+        TelemetryCodec().decode(MAGIC + b'\x01')
+
+
+def test_unknown_schema_rejected():
+    with pytest.raises(ValueError, match="Unknown telemetry schema"):
+        TelemetryCodec().decode(HEADER.pack(MAGIC, 99, 1, 0))
+
+
+def test_length_mismatch_rejected():
+    payload = TelemetryCodec().encode(SETPOINT_SCHEMA, [sample_for(SETPOINT_SCHEMA, 0)])
+    with pytest.raises(ValueError, match="expected"):
+        TelemetryCodec().decode(payload[:-1])
+
+
+def test_missing_timestamp_rejected():
+    with pytest.raises(ValueError, match="timestamp"):
+        TelemetryCodec().encode(SETPOINT_SCHEMA, [{'setpoint': 50.0}])
+
+
+def test_wrong_setpoint_length_falls_back_to_json():
+    codec = TelemetryCodec()
+    codec.prefer(TOPIC, BINARY_CONTENT_TYPE)
+    codec.handle_accept({'topic': TOPIC, 'peer': 'lower', 'contentTypes': [BINARY_CONTENT_TYPE]})
+    sample = dict(sample_for(SCHEDULE_SCHEMA, 0), setpoints=[50.0] * 96)
+
+    payload = codec.encode_for_topic(TOPIC, SCHEDULE_SCHEMA, [sample], {'type': 'economic_setpoint'})
+
+    assert json.loads(payload) == {'type': 'economic_setpoint'}
+
+
+def test_json_unless_binary_preferred():
+    codec = TelemetryCodec()
+    codec.handle_accept({'topic': TOPIC, 'peer': 'lower', 'contentTypes': [BINARY_CONTENT_TYPE]})
+    assert codec.content_type(TOPIC) == JSON_CONTENT_TYPE
+
+
+def test_json_until_a_reader_announces():
+    codec = TelemetryCodec()
+    codec.prefer(TOPIC, BINARY_CONTENT_TYPE)
+    assert codec.content_type(TOPIC) == JSON_CONTENT_TYPE
+
+    codec.handle_accept({'topic': TOPIC, 'peer': 'lower', 'contentTypes': [BINARY_CONTENT_TYPE]})
+    assert codec.content_type(TOPIC) == BINARY_CONTENT_TYPE
+
+
+def test_json_only_reader_forces_json():
+    codec = TelemetryCodec()
+    codec.prefer(TOPIC, BINARY_CONTENT_TYPE)
+    codec.handle_accept({'topic': TOPIC, 'peer': 'lower', 'contentTypes': [BINARY_CONTENT_TYPE]})
+    codec.handle_accept({'topic': TOPIC, 'peer': 'dashboard', 'contentTypes': [JSON_CONTENT_TYPE]})
+    assert codec.content_type(TOPIC) == JSON_CONTENT_TYPE
+
+
+def test_unannounced_expected_reader_forces_json():
+    codec = TelemetryCodec()
+    codec.prefer(TOPIC, BINARY_CONTENT_TYPE, readers=['lower', 'dashboard'])
+    codec.handle_accept({'topic': TOPIC, 'peer': 'lower', 'contentTypes': [BINARY_CONTENT_TYPE]})
+    assert codec.content_type(TOPIC) == JSON_CONTENT_TYPE
+
+    codec.handle_accept({'topic': TOPIC, 'peer': 'dashboard',
+                         'contentTypes': [BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE]})
+    assert codec.content_type(TOPIC) == BINARY_CONTENT_TYPE
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize, LinearConstraint
+from upper_layer_mpc import UpperLayerMPC
+
+
+def baseline_solve(mpc, current_state):
+    """The original formulation: hinge demand penalty and per-step abs() ramp constraints"""
+    def objective(u):
+        total_cost = 0
+        for k in range(mpc.horizon):
+            electricity_cost = u[k] * mpc.electricity_prices[k]
+            pv_penalty = -mpc.pv_forecast[k] * 0.1
+            demand_penalty = max(0, mpc.oxygen_demand_forecast[k] - u[k]) * 100
+            previous = current_state['production'] if k == 0 else u[k - 1]
+            ramp_penalty = (u[k] - previous)**2 * 0.01
+            total_cost += electricity_cost + pv_penalty + demand_penalty + ramp_penalty
+        return total_cost
+
+    constraints = []
+    for k in range(mpc.horizon):
+        if k == 0:
+            def ramp_constraint(u, k=k):
+                return mpc.max_ramp_rate - abs(u[k] - current_state['production'])
+        else:
+            def ramp_constraint(u, k=k):
+                return mpc.max_ramp_rate - abs(u[k] - u[k - 1])
+        constraints.append({'type': 'ineq', 'fun': ramp_constraint})
+
+    result = minimize(
+        fun=objective,
+        x0=np.ones(mpc.horizon) * current_state['production'],
+        method='SLSQP',
+        bounds=[(mpc.min_production, mpc.max_production)] * mpc.horizon,
+        constraints=constraints
+    )
+    return result, objective
+
+
+@pytest.fixture(scope='module')
+def mpc():
+    return UpperLayerMPC(connect_mqtt=False)
+
+
+@pytest.mark.parametrize('production', [10, 20, 35, 50, 75, 95, 100])
+def test_cost_no_worse_than_baseline(mpc, production):
+    current_state = dict(mpc.get_current_state(), production=production)
+    baseline, baseline_objective = baseline_solve(mpc, current_state)
+    result = mpc.optimize(current_state)
+
+    assert result.success
+    assert mpc.is_feasible(result.x, current_state)
+    # Same cost function as the original formulation
+    assert result.fun == pytest.approx(baseline_objective(result.x))
+    if baseline.success:
+        assert result.fun <= baseline.fun + 1e-6
+
+
+@pytest.mark.parametrize('production', [20, 75, 95])
+def test_reaches_global_optimum(mpc, production):
+    """The problem is convex, so an independent solver must agree on the optimum"""
+    current_state = dict(mpc.get_current_state(), production=production)
+    horizon = mpc.horizon
+    # Every constraint is affine, fun(x) = A x + c >= 0
+    origin = np.zeros(2 * horizon)
+    constraints = [
+        LinearConstraint(constraint['jac'](origin), -constraint['fun'](origin), np.inf)
+        for constraint in mpc.build_constraints(current_state)
+    ]
+    x0 = np.concatenate([
+        np.full(horizon, float(production)),
+        np.maximum(0, np.asarray(mpc.oxygen_demand_forecast) - production)
+    ])
+
+    reference = minimize(
+        mpc.smooth_objective, x0, args=(current_state,), jac=mpc.smooth_gradient,
+        method='trust-constr', constraints=constraints,
+        bounds=[(mpc.min_production, mpc.max_production)] * horizon + [(0, None)] * horizon,
+        options={'gtol': 1e-10, 'xtol': 1e-12, 'maxiter': 5000}
+    )
+
+    assert mpc.optimize(current_state).fun == pytest.approx(
+        mpc.objective_function(reference.x[:horizon], current_state), abs=1e-3
+    )
+
+
+def test_long_horizon_converges(mpc):
+    long_horizon = UpperLayerMPC(connect_mqtt=False)
+    long_horizon.horizon = 96
+    long_horizon.time_step = 0.25
+    hours = np.arange(96) // 4
+    long_horizon.electricity_prices = np.asarray(mpc.electricity_prices)[hours]
+    long_horizon.pv_forecast = np.asarray(mpc.pv_forecast)[hours]
+    long_horizon.oxygen_demand_forecast = np.asarray(mpc.oxygen_demand_forecast)[hours]
+
+    result = long_horizon.optimize({'production': 75.0})
+
+    assert result.success
@@ -5,9 +5,11 @@ import json
 import paho.mqtt.client as mqtt
 from datetime import datetime
 import logging
+import time
+from telemetry_codec import TelemetryCodec, SCHEDULE_SCHEMA, SETPOINT_SCHEMA, NEGOTIATION_TOPIC
 
 class UpperLayerMPC:
-    def __init__(self):
+    def __init__(self, connect_mqtt=True):
         self.horizon = 24  # 24-hour optimization horizon
         self.time_step = 1  # 1-hour steps
         self.optimization_results = {}
@@ -22,11 +24,18 @@ class UpperLayerMPC:
         self.min_production = 10   # kW
         self.max_ramp_rate = 20    # kW/hour
         
-        # MQTT setup
-        self.setup_mqtt()
-        
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        
+        # Deadline-aware scheduler, attached when running both control cadences
+        self.scheduler = None
+        
+        # Wire format (JSON unless binary is negotiated per topic)
+        self.codec = TelemetryCodec()
+        
+        # MQTT setup (skipped for offline use such as backtesting)
+        if connect_mqtt:
+            self.setup_mqtt()
 
     def setup_mqtt(self):
         self.mqtt_client = mqtt.Client()
@@ -43,18 +52,25 @@ class UpperLayerMPC:
         self.logger.info("Connected to MQTT broker")
         client.subscribe("electrolyzer/he-nmpc/upper_commands")
         client.subscribe("electrolyzer/simulink/out")
+        client.subscribe(NEGOTIATION_TOPIC)
+        self.codec.announce(client, "upper_layer_mpc", ["electrolyzer/simulink/out"])
 
     def on_message(self, client, userdata, msg):
         try:
-            payload = json.loads(msg.payload.decode())
+            payload = self.codec.decode(msg.payload)
             self.handle_message(msg.topic, payload)
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON decode error: {e}")
+        except ValueError as e:
+            self.logger.error(f"Payload decode error: {e}")
 
     def handle_message(self, topic, data):
-        if topic == "electrolyzer/he-nmpc/upper_commands":
+        if topic == NEGOTIATION_TOPIC:
+            self.codec.handle_accept(data)
+        elif topic == "electrolyzer/he-nmpc/upper_commands":
             if data.get('command') == 'RUN_OPTIMIZATION':
-                self.run_economic_optimization(data)
+                if self.scheduler is not None:
+                    self.scheduler.trigger()
+                else:
+                    self.run_economic_optimization(data)
         elif topic == "electrolyzer/simulink/out":
             self.update_system_state(data)
 
@@ -80,70 +96,121 @@ class UpperLayerMPC:
 
     def solve_mpc(self, current_state):
         """Solve the MPC optimization problem"""
-        # Initial guess
-        x0 = np.ones(self.horizon) * current_state['production']
+        result = self.optimize(current_state)
+        
+        if result.success:
+            return self.format_solution(result.x, current_state)
+        else:
+            raise RuntimeError("Optimization failed to converge")
+
+    def optimize(self, current_state, callback=None):
+        """Run SLSQP on the smooth formulation; result.x and callback iterates are setpoints"""
+        horizon = self.horizon
+        demand = np.asarray(self.oxygen_demand_forecast[:horizon], dtype=float)
         
-        # Bounds
-        bounds = [(self.min_production, self.max_production)] * self.horizon
+        # Initial guess: hold production, with the matching demand shortfall
+        u0 = np.ones(horizon) * current_state['production']
+        x0 = np.concatenate([u0, np.maximum(0, demand - u0)])
+        
+        # Bounds (setpoints, then non-negative shortfall slack)
+        bounds = [(self.min_production, self.max_production)] * horizon + [(0, None)] * horizon
         
         # Constraints
         constraints = self.build_constraints(current_state)
         
         # Solve optimization
         result = minimize(
-            fun=self.objective_function,
+            fun=self.smooth_objective,
             x0=x0,
+            jac=self.smooth_gradient,
             args=(current_state,),
             method='SLSQP',
             bounds=bounds,
-            constraints=constraints
+            constraints=constraints,
+            callback=(lambda x: callback(x[:horizon])) if callback is not None else None,
+            options={'maxiter': max(100, 5 * horizon)}
         )
         
-        if result.success:
-            return self.format_solution(result.x, current_state)
-        else:
-            raise RuntimeError("Optimization failed to converge")
+        result.x = result.x[:horizon]
+        result.fun = self.objective_function(result.x, current_state)
+        return result
+
+    def is_feasible(self, u, current_state, tolerance=1e-6):
+        """Check a schedule against the production bounds and ramp limits"""
+        u = np.asarray(u, dtype=float)
+        within_bounds = np.all(u >= self.min_production - tolerance) and \
+            np.all(u <= self.max_production + tolerance)
+        ramps = np.abs(np.diff(u, prepend=current_state['production']))
+        return bool(within_bounds and np.all(ramps <= self.max_ramp_rate * self.time_step + tolerance))
 
     def objective_function(self, u, current_state):
         """MPC objective function - minimize total cost"""
-        total_cost = 0
+        u = np.asarray(u, dtype=float)
+        prices = np.asarray(self.electricity_prices[:self.horizon], dtype=float)
+        pv = np.asarray(self.pv_forecast[:self.horizon], dtype=float)
+        demand = np.asarray(self.oxygen_demand_forecast[:self.horizon], dtype=float)
         
-        for k in range(self.horizon):
-            # Electricity cost
-            electricity_cost = u[k] * self.electricity_prices[k]
-            
-            # PV utilization penalty (negative when using PV)
-            pv_penalty = -self.pv_forecast[k] * 0.1  # Incentivize PV usage
-            
-            # Demand satisfaction penalty
-            demand_penalty = max(0, self.oxygen_demand_forecast[k] - u[k]) * 100
-            
-            # Ramping penalty
-            if k == 0:
-                ramp_penalty = (u[k] - current_state['production'])**2 * 0.01
-            else:
-                ramp_penalty = (u[k] - u[k-1])**2 * 0.01
-            
-            total_cost += electricity_cost + pv_penalty + demand_penalty + ramp_penalty
+        # Electricity cost
+        electricity_cost = u @ prices
         
-        return total_cost
+        # PV utilization penalty (negative when using PV)
+        pv_penalty = -pv.sum() * 0.1  # Incentivize PV usage
+        
+        # Demand satisfaction penalty
+        demand_penalty = np.maximum(0, demand - u).sum() * 100
+        
+        # Ramping penalty (first step relative to current production)
+        ramps = np.diff(u, prepend=current_state['production'])
+        ramp_penalty = (ramps**2).sum() * 0.01
+        
+        return electricity_cost + pv_penalty + demand_penalty + ramp_penalty
+
+    def smooth_objective(self, x, current_state):
+        """objective_function with the demand hinge replaced by a shortfall slack s >= demand - u"""
+        u, shortfall = x[:self.horizon], x[self.horizon:]
+        prices = np.asarray(self.electricity_prices[:self.horizon], dtype=float)
+        pv = np.asarray(self.pv_forecast[:self.horizon], dtype=float)
+        
+        ramps = np.diff(u, prepend=current_state['production'])
+        return u @ prices - pv.sum() * 0.1 + shortfall.sum() * 100 + (ramps**2).sum() * 0.01
+
+    def smooth_gradient(self, x, current_state):
+        """Gradient of smooth_objective with respect to setpoints and shortfall"""
+        u = x[:self.horizon]
+        prices = np.asarray(self.electricity_prices[:self.horizon], dtype=float)
+        
+        ramps = np.diff(u, prepend=current_state['production'])
+        ramp_gradient = 0.02 * ramps
+        ramp_gradient[:-1] -= 0.02 * ramps[1:]
+        
+        return np.concatenate([prices + ramp_gradient, np.full(self.horizon, 100.0)])
 
     def build_constraints(self, current_state):
-        """Build optimization constraints"""
-        constraints = []
-        
-        # Ramping constraints
-        for k in range(self.horizon):
-            if k == 0:
-                def ramp_constraint(u, k=k):
-                    return self.max_ramp_rate - abs(u[k] - current_state['production'])
-            else:
-                def ramp_constraint(u, k=k):
-                    return self.max_ramp_rate - abs(u[k] - u[k-1])
-            
-            constraints.append({'type': 'ineq', 'fun': ramp_constraint})
+        """Build optimization constraints (all linear in setpoints and shortfall)"""
+        horizon = self.horizon
+        demand = np.asarray(self.oxygen_demand_forecast[:horizon], dtype=float)
+        max_ramp = self.max_ramp_rate * self.time_step
+        
+        # Ramps D @ u - offset, first step relative to current production
+        difference = np.eye(horizon) - np.eye(horizon, k=-1)
+        offset = np.zeros(horizon)
+        offset[0] = current_state['production']
+        ramp_jacobian = np.hstack([difference, np.zeros((horizon, horizon))])
         
-        return constraints
+        # Shortfall slack must cover unmet demand: s + u - demand >= 0
+        shortfall_jacobian = np.hstack([np.eye(horizon), np.eye(horizon)])
+        
+        return [
+            {'type': 'ineq',
+             'fun': lambda x: max_ramp - (difference @ x[:horizon] - offset),
+             'jac': lambda x: -ramp_jacobian},
+            {'type': 'ineq',
+             'fun': lambda x: max_ramp + (difference @ x[:horizon] - offset),
+             'jac': lambda x: ramp_jacobian},
+            {'type': 'ineq',
+             'fun': lambda x: x[horizon:] + x[:horizon] - demand,
+             'jac': lambda x: shortfall_jacobian}
+        ]
 
     def format_solution(self, solution, current_state):
         """Format the optimization solution"""
@@ -165,15 +232,38 @@ class UpperLayerMPC:
 
     def send_to_lower_layer(self, schedule):
         """Send optimized schedule to lower layer"""
+        topic = "electrolyzer/he-nmpc/lower_commands"
         message = {
             'type': 'economic_setpoint',
             'schedule': schedule,
             'timestamp': datetime.now().isoformat()
         }
+        sample = {
+            'timestamp': time.time(),
+            'timeStep': schedule['time_step'],
+            'totalCost': schedule['total_cost'],
+            'pvUtilization': schedule['pv_utilization'],
+            'setpoints': schedule['setpoints']
+        }
+        
+        self.mqtt_client.publish(
+            topic,
+            self.codec.encode_for_topic(topic, SCHEDULE_SCHEMA, [sample], message)
+        )
+
+    def publish_active_setpoint(self, setpoint):
+        """Publish the currently active economic setpoint on its own topic"""
+        topic = "electrolyzer/he-nmpc/active_setpoint"
+        message = {
+            'type': 'active_setpoint',
+            'setpoint': float(setpoint),
+            'timestamp': datetime.now().isoformat()
+        }
+        sample = {'timestamp': time.time(), 'setpoint': float(setpoint)}
         
         self.mqtt_client.publish(
-            "electrolyzer/he-nmpc/lower_commands",
-            json.dumps(message)
+            topic,
+            self.codec.encode_for_topic(topic, SETPOINT_SCHEMA, [sample], message)
         )
 
     def get_current_state(self):
@@ -188,7 +278,7 @@ class UpperLayerMPC:
         }
 
     def update_system_state(self, data):
-        """Update system state with real-time data"""
+        """Update system state with real-time data (dict or batch of binary samples)"""
         # Update internal state with real-time measurements
         pass
 
@@ -227,13 +317,19 @@ class UpperLayerMPC:
         self.logger.info(f"Optimization completed: Cost = {results['total_cost']:.2f}")
 
 if __name__ == "__main__":
+    from mpc_scheduler import DeadlineScheduler
+    
     mpc = UpperLayerMPC()
+    # No safety-setpoint computation runs in Python yet (it lives on the Arduino), so the
+    # lower cadence only re-publishes the active economic setpoint
+    mpc.scheduler = DeadlineScheduler(mpc, lower_step=mpc.publish_active_setpoint)
+    mpc.scheduler.start()
     
     # Keep the script running
     try:
         while True:
-            import time
             time.sleep(10)
     except KeyboardInterrupt:
+        mpc.scheduler.stop()
         mpc.mqtt_client.loop_stop()
         print("MPC stopped")